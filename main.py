@@ -1,16 +1,23 @@
 import asyncio
 import csv
-import json
 import logging
 import os
 import re
 from collections import deque
+from functools import partial
 from http import HTTPStatus
 from pathlib import Path
+from urllib.parse import urlsplit
 
 import aiohttp
+import orjson
 from fastapi import FastAPI, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import (
+    FileResponse,
+    JSONResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
@@ -20,6 +27,9 @@ CFG_FILE = BASE_DIR / "config.json"
 
 PLACES_API_URL = "https://places.googleapis.com/v1/places:searchText"
 PAGE_SIZE = 20
+SEARCH_CONCURRENCY = 2  # kept low: Places quota is per minute and 429 is final
+SSE_KEEPALIVE = 15
+SSE_MIN_INTERVAL = 1
 
 DEFAULT_CFG = {
     "search_terms": "", "locations": "",
@@ -30,14 +40,35 @@ FIELDS = [
     "Company", "Email", "Phone", "Website", "Category",
     "Address", "Rating", "Reviews", "Maps URL",
 ]
-EMAIL_RE = re.compile(r"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,63}\b")
+EMAIL_RE = re.compile(rb"\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,24}\b")
+INVALID_EMAIL_PARTS = ("@example.", "@yourdomain.", "sentry.io", "wixpress.com")
+INVALID_EMAIL_RE = re.compile(
+    rb"\.(?:png|jpe?g|gif|svg|webp)$|@domain\.com$|"
+    + "|".join(map(re.escape, INVALID_EMAIL_PARTS)).encode("ascii")
+)
+SOCIAL_HOSTS = frozenset({
+    "facebook.com", "instagram.com", "linkedin.com", "twitter.com", "x.com",
+    "youtube.com", "tiktok.com",
+})
 CONTACT_PATHS = ("contact", "about", "contact-us", "kontakt", "epikoinonia")
+TEXT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+ENRICH_TIMEOUT = aiohttp.ClientTimeout(total=8)
+ENRICH_HEADERS = {"User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"}
+
+
+_cfg_cache: dict = {"mtime": None, "data": DEFAULT_CFG}
 
 
 def load_config():
-    if CFG_FILE.exists():
-        return json.loads(CFG_FILE.read_text())
-    return dict(DEFAULT_CFG)
+    try:
+        mtime = CFG_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        _cfg_cache["mtime"] = None
+        return dict(DEFAULT_CFG)
+    if mtime != _cfg_cache["mtime"]:
+        _cfg_cache["data"] = orjson.loads(CFG_FILE.read_bytes())
+        _cfg_cache["mtime"] = mtime
+    return _cfg_cache["data"]
 
 
 def _sanitize_cfg(cfg: dict) -> dict | None:
@@ -61,13 +92,25 @@ def _sanitize_cfg(cfg: dict) -> dict | None:
     return cleaned or None
 
 
+_status_changed = asyncio.Event()
+
+
+def _notify_status():
+    global _status_changed
+    _status_changed.set()
+    _status_changed = asyncio.Event()
+
+
 class MemoryHandler(logging.Handler):
     def __init__(self, capacity=50):
         super().__init__()
         self.buffer = deque(maxlen=capacity)
+        self.seq = 0
 
     def emit(self, record):
         self.buffer.append(self.format(record))
+        self.seq += 1
+        _notify_status()
 
 
 log_handler = MemoryHandler()
@@ -85,13 +128,26 @@ def _places_headers(api_key):
         "Content-Type": "application/json",
         "X-Goog-Api-Key": api_key,
         "X-Goog-FieldMask": (
-            "places.id,places.displayName,places.primaryType,places.formattedAddress,"
+            "places.displayName,places.primaryType,places.formattedAddress,"
             "places.nationalPhoneNumber,places.websiteUri,places.rating,"
             "places.userRatingCount,places.googleMapsUri,nextPageToken"
         ),
     }
 
 
+def _is_social(url: str) -> bool:
+    labels = (urlsplit(url).hostname or "").split(".")
+    return any(".".join(labels[i:]) in SOCIAL_HOSTS for i in range(len(labels) - 1))
+
+
+def _find_email(body: bytes) -> str | None:
+    for m in EMAIL_RE.finditer(body):
+        email = m.group(0).lower()
+        if not INVALID_EMAIL_RE.search(email):
+            return email.decode("ascii")
+    return None
+
+
 async def _fetch_page(session, api_key, body):
     try:
         async with session.post(
@@ -115,37 +171,48 @@ async def _fetch_page(session, api_key, body):
 class Engine:
     def __init__(self):
         self.active = False
-        self._seen_urls: set[str] = set()
-        self._lock = asyncio.Lock()
+        self._seen_urls: set[str] | None = None
         self._cache: list[dict] = []
-        self._cache_mtime: float = 0
-        if DB_FILE.exists():
-            with open(DB_FILE, encoding="utf-8") as f:
-                self._seen_urls = {r.get("Maps URL", "") for r in csv.DictReader(f)}
+        self._cache_key: tuple[int, int] | None = None
+        self._leads_rev = 0
 
-    def _read_leads(self):
+    def _load_seen_urls(self):
         if not DB_FILE.exists():
-            return []
+            return set()
+        with open(DB_FILE, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            if "Maps URL" not in header:
+                return set()
+            i = header.index("Maps URL")
+            return {r[i] for r in reader if len(r) > i}
+
+    def _read_leads(self):
         with open(DB_FILE, encoding="utf-8") as f:
             return list(csv.DictReader(f))
 
     def _read_leads_cached(self):
-        if not DB_FILE.exists():
-            self._cache, self._cache_mtime = [], 0
+        try:
+            st = DB_FILE.stat()
+        except FileNotFoundError:
+            self._cache, self._cache_key = [], None
             return []
-        mtime = DB_FILE.stat().st_mtime
-        if mtime != self._cache_mtime:
+        key = (st.st_mtime_ns, st.st_size)
+        if key != self._cache_key:
             self._cache = self._read_leads()
-            self._cache_mtime = mtime
+            self._cache_key = key
         return self._cache
 
-    def _append(self, row: dict):
+    def _invalidate_cache(self):
+        self._cache, self._cache_key = [], None
+
+    def _append(self, rows: list[dict]):
         exists = DB_FILE.exists()
         with open(DB_FILE, "a", newline="", encoding="utf-8") as f:
             w = csv.DictWriter(f, fieldnames=FIELDS)
             if not exists:
                 w.writeheader()
-            w.writerow(row)
+            w.writerows(rows)
 
     def _rewrite(self, rows: list[dict]):
         tmp = DB_FILE.with_suffix(".tmp")
@@ -158,11 +225,13 @@ class Engine:
     async def run(self, cfg):
         self.active = True
         try:
-            await self._run(cfg)
+            async with aiohttp.ClientSession() as session:
+                await self._run(session, cfg)
         finally:
             self.active = False
+            _notify_status()
 
-    async def _run(self, cfg):
+    async def _run(self, session, cfg):
         log.info("Starting scraper...")
         api_key = os.environ.get("PLACES_API_KEY") or cfg.get("api_key", "").strip()
         if not api_key:
@@ -172,65 +241,56 @@ class Engine:
             )
             return
 
-        queries = [
-            f"{t.strip()} {loc.strip()}"
-            for t in cfg["search_terms"].split(",") if t.strip()
-            for loc in cfg["locations"].split(",") if loc.strip()
-        ]
+        terms = [t for t in map(str.strip, cfg["search_terms"].split(",")) if t]
+        locations = [loc for loc in map(str.strip, cfg["locations"].split(",")) if loc]
+        queries = [f"{t} {loc}" for t in terms for loc in locations]
         if not queries:
             log.info("No search queries configured.")
             return
 
+        if self._seen_urls is None:
+            seen = await asyncio.to_thread(self._load_seen_urls)
+            # A clear may have reset the set while the file was being read.
+            if self._seen_urls is None:
+                self._seen_urls = seen
+
         limit = int(cfg.get("max_results", 20))
-        async with aiohttp.ClientSession() as session:
-            for q in queries:
-                if not self.active:
-                    break
-                await self._search_places(session, api_key, q, limit)
+        workers = min(int(cfg.get("concurrency", 5)), 10)
+        search = partial(self._search_places, session, api_key, limit=limit)
+        pending = iter(queries)
+        await asyncio.gather(*(
+            self._drain(pending, search)
+            for _ in range(min(SEARCH_CONCURRENCY, len(queries)))
+        ))
 
         if not self.active:
             return
 
-        async with self._lock:
-            sites = [
-                r for r in self._read_leads_cached()
-                if r.get("Website") and not r.get("Email")
-            ]
+        sites = list({
+            r["Website"]: r for r in self._read_leads_cached()
+            if r.get("Website") and not r.get("Email") and not _is_social(r["Website"])
+        }.values())
         if not sites:
             log.info("Done.")
             return
 
         log.info(f"Enriching {len(sites)} websites...")
-        sem = asyncio.Semaphore(min(int(cfg.get("concurrency", 5)), 10))
-        timeout = aiohttp.ClientTimeout(total=8)
-        headers = {
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"
+        enrich = partial(self._enrich, session)
+        pending = iter(sites)
+        await asyncio.gather(*(self._drain(pending, enrich) for _ in range(workers)))
+
+        all_leads = self._read_leads_cached()
+        emails = {
+            r["Website"]: r.get("Email")
+            for r in sites
+            if r.get("Website") and r.get("Email")
         }
-        async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-            tasks = [
-                asyncio.create_task(self._enrich(session, res, sem)) for res in sites
-            ]
-            while tasks:
-                if not self.active:
-                    for t in tasks:
-                        t.cancel()
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                    break
-                _, tasks = await asyncio.wait(
-                    tasks, return_when=asyncio.FIRST_COMPLETED
-                )
-
-        async with self._lock:
-            all_leads = self._read_leads_cached()
-            emails = {
-                r["Website"]: r.get("Email")
-                for r in sites
-                if r.get("Website") and r.get("Email")
-            }
-            for lead in all_leads:
-                if email := emails.get(lead.get("Website")):
-                    lead["Email"] = email
-            self._rewrite(all_leads)
+        for lead in all_leads:
+            if email := emails.get(lead.get("Website")):
+                lead["Email"] = email
+        self._rewrite(all_leads)
+        st = DB_FILE.stat()
+        self._cache_key = (st.st_mtime_ns, st.st_size)
         log.info("Done.")
 
     async def _search_places(self, session, api_key, q, limit):
@@ -258,17 +318,17 @@ class Engine:
 
             page_info = "initial" if not page_token else "next"
             log.info(f"Searching: {q} ({page_info} page, {len(places)} results)")
+            captured = []
             for place in places:
                 if not self.active:
-                    return
+                    break
                 if limit and count >= limit:
                     break
 
                 maps_url = (place.get("googleMapsUri") or "").rstrip("/")
-                async with self._lock:
-                    if maps_url in self._seen_urls:
-                        continue
-                    self._seen_urls.add(maps_url)
+                if maps_url in self._seen_urls:
+                    continue
+                self._seen_urls.add(maps_url)
 
                 res = {
                     "Company": (place.get("displayName") or {}).get("text", ""),
@@ -283,40 +343,60 @@ class Engine:
                 }
 
                 count += 1
-                async with self._lock:
-                    self._append(res)
+                captured.append(res)
+            if captured:
+                self._append(captured)
+            for res in captured:
                 log.info(f"Captured: {res['Company']}")
 
             page_token = data.get("nextPageToken")
             if not page_token:
                 break
 
-    async def _enrich(self, session, res, sem):
-        async with sem:
+    async def _drain(self, pending, job):
+        for item in pending:
             if not self.active:
                 return
-            base = res["Website"]
-            urls = dict.fromkeys(
-                [base] + [f"{base.rstrip('/')}/{p}" for p in CONTACT_PATHS]
-            )
-            for url in urls:
-                try:
-                    async with session.get(
-                        url, ssl=False, allow_redirects=True
-                    ) as resp:
-                        if resp.status != HTTPStatus.OK:
-                            continue
-                        html = await resp.text(errors="ignore")
-                    if m := EMAIL_RE.search(html):
-                        res["Email"] = m.group(0).lower()
-                        break
-                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    log.debug(f"Fetch failed for {url}: {e}")
-                    continue
-            log.info(
-                f"Enriched: {res.get('Company', base)} "
-                f"{'✓' if res.get('Email') else '—'}"
-            )
+            try:
+                await job(item)
+            except Exception as e:  # noqa: BLE001
+                log.warning(f"Worker job failed: {e!r}")
+
+    async def _enrich(self, session, res):
+        base = res["Website"]
+        urls = dict.fromkeys(
+            [base] + [f"{base.rstrip('/')}/{p}" for p in CONTACT_PATHS]
+        )
+        for url in urls:
+            if not self.active:
+                return
+            try:
+                async with session.get(
+                    url,
+                    headers=ENRICH_HEADERS,
+                    timeout=ENRICH_TIMEOUT,
+                    ssl=False,
+                    allow_redirects=True,
+                ) as resp:
+                    # aiohttp reports a missing header as octet-stream; only
+                    # skip bodies that explicitly declare a non-text type.
+                    if resp.status != HTTPStatus.OK or (
+                        "Content-Type" in resp.headers
+                        and resp.content_type not in TEXT_TYPES
+                    ):
+                        continue
+                    body = await resp.read()
+                if email := _find_email(body):
+                    res["Email"] = email
+                    self._leads_rev += 1
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                log.debug(f"Fetch failed for {url}: {e}")
+                continue
+        log.info(
+            f"Enriched: {res.get('Company', base)} "
+            f"{'✓' if res.get('Email') else '—'}"
+        )
 
 
 engine = Engine()
@@ -330,22 +410,65 @@ async def index(request: Request):
     return templates.TemplateResponse(request, "index.html")
 
 
-@app.get("/api/status")
-async def status():
-    async with engine._lock:
-        leads = engine._read_leads_cached()
-    return {
+def _status_snapshot():
+    leads = engine._read_leads_cached()
+    cfg = load_config()
+    leads_version = (engine._cache_key, engine._leads_rev)
+    state = (leads_version, engine.active, log_handler.seq, _cfg_cache["mtime"])
+    etag = f'W/"{hash(state) & 0xFFFFFFFFFFFFFFFF:x}"'
+    payload = {
         "running": engine.active,
         "leads": leads,
         "logs": list(log_handler.buffer),
-        "config": load_config(),
+        "config": cfg,
     }
+    return etag, payload, leads_version
+
+
+@app.get("/api/status")
+async def status(request: Request):
+    etag, payload, _ = _status_snapshot()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+    return Response(
+        orjson.dumps(payload), media_type="application/json", headers=headers
+    )
+
+
+@app.get("/api/events")
+async def events():
+    async def stream():
+        last = last_leads = None
+        while True:
+            changed = _status_changed
+            etag, payload, leads_version = _status_snapshot()
+            if etag != last:
+                last = etag
+                if leads_version == last_leads:
+                    del payload["leads"]
+                last_leads = leads_version
+                yield b"data: " + orjson.dumps(payload) + b"\n\n"
+                await asyncio.sleep(SSE_MIN_INTERVAL)
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), SSE_KEEPALIVE)
+            except TimeoutError:
+                yield b": ping\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/control/{action}")
 async def control(action: str):
     if action == "start" and not engine.active:
-        task = asyncio.create_task(engine.run(load_config()))
+        cfg = load_config()
+        engine.active = True
+        task = asyncio.create_task(engine.run(cfg))
         task.add_done_callback(
             lambda t: log.error(f"Scraper crashed: {t.exception()}")
             if t.exception()
@@ -354,8 +477,8 @@ async def control(action: str):
     elif action == "stop":
         engine.active = False
     elif action == "clear":
-        async with engine._lock:
-            engine._seen_urls.clear()
+        engine._seen_urls = set()
+        engine._invalidate_cache()
         DB_FILE.unlink(missing_ok=True)
         log_handler.buffer.clear()
         log.info("Results cleared.")
@@ -372,15 +495,22 @@ async def save_config(request: Request):
     cleaned = _sanitize_cfg(cfg)
     if cleaned is None:
         return JSONResponse({"error": "Invalid"}, status_code=400)
-    CFG_FILE.write_text(json.dumps(cleaned))
+    CFG_FILE.write_bytes(orjson.dumps(cleaned))
+    _cfg_cache["data"] = cleaned
+    _cfg_cache["mtime"] = CFG_FILE.stat().st_mtime_ns
+    _notify_status()
     return {"success": True}
 
 
 @app.get("/download")
 async def download():
-    if not DB_FILE.exists():
+    try:
+        st = DB_FILE.stat()
+    except FileNotFoundError:
         return JSONResponse({"error": "No data yet"}, status_code=404)
-    return FileResponse(DB_FILE, filename="contacts.csv", media_type="text/csv")
+    return FileResponse(
+        DB_FILE, stat_result=st, filename="contacts.csv", media_type="text/csv"
+    )
 
 
 if __name__ == "__main__":
@@ -389,4 +519,5 @@ if __name__ == "__main__":
         app,
         host=os.environ.get("HOST", "0.0.0.0"),
         port=int(os.environ.get("PORT", "8000")),
+        timeout_graceful_shutdown=5,
     )